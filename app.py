@@ -1,16 +1,21 @@
 # app.py - Fixed for Flask 3.0
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta, timezone
 import jwt
 import hashlib
-import random
+import hmac
 import string
 import os
-from functools import wraps
-import json
+from functools import lru_cache, wraps
+from cachetools import TTLCache
+import orjson
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -25,6 +30,54 @@ if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
         'postgres://', 'postgresql://', 1)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# ============= SERIALIZATION =============
+
+
+# orjson is much faster than stdlib json for the puzzle/progress columns
+# we (de)serialize on every request. It returns bytes, so decode for the
+# Text columns that expect str.
+def _dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+_loads = orjson.loads
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson so jsonify responses (and
+    request.json parsing) skip the stdlib encoder."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = OrjsonProvider(app)
+
+# Let the engine use orjson for the JSON-typed columns as well
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'json_serializer': _dumps,
+    'json_deserializer': _loads,
+}
+
+# Pool tuning for Postgres so concurrent workers don't serialize on the
+# default 5-connection pool; pre-ping and recycle guard against stale
+# connections on the platform's ephemeral networking. SQLite (local dev)
+# keeps its defaults.
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update(
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        connect_args={
+            'application_name': 'wordheist',
+            'options': '-c statement_timeout=5000',
+        },
+    )
+
 # Initialize extensions
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
@@ -56,8 +109,10 @@ class Puzzle(db.Model):
     date = db.Column(db.Date, unique=True, nullable=False)
     letters = db.Column(db.String(20), nullable=False)  # JSON array of letters
     mystery_word = db.Column(db.String(20), nullable=False)
-    # JSON object with word lists
-    valid_words = db.Column(db.Text, nullable=False)
+    # JSON object with word lists; JSONB on Postgres so the word buckets
+    # can also be queried server-side without re-parsing text
+    valid_words = db.Column(
+        db.JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
     difficulty = db.Column(db.String(20), default='medium')
     theme = db.Column(db.String(100))
     case_number = db.Column(db.Integer)
@@ -67,6 +122,11 @@ class Puzzle(db.Model):
     scores = db.relationship('Score', backref='puzzle', lazy=True)
     progress = db.relationship('UserProgress', backref='puzzle', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_puzzle_valid_words_gin', 'valid_words',
+                 postgresql_using='gin'),
+    )
+
 
 class Score(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -75,24 +135,46 @@ class Score(db.Model):
         'puzzle.id'), nullable=False)
     score = db.Column(db.Integer, nullable=False)
     time_taken = db.Column(db.Integer)  # in seconds
-    words_found = db.Column(db.Text)  # JSON array of found words
     completed = db.Column(db.Boolean, default=False)
     hints_used = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_score_user_puzzle', 'user_id', 'puzzle_id'),
+        db.Index('ix_score_puzzle_score', 'puzzle_id', 'score'),
+    )
+
 
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     puzzle_id = db.Column(db.Integer, db.ForeignKey(
         'puzzle.id'), nullable=False)
-    found_words = db.Column(db.Text, default='[]')  # JSON array
     current_score = db.Column(db.Integer, default=0)
     hints_used = db.Column(db.Integer, default=0)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed = db.Column(db.Boolean, default=False)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'puzzle_id'),)
+    __table_args__ = (
+        db.Index('ix_progress_user_puzzle', 'user_id', 'puzzle_id',
+                 unique=True),
+    )
+
+
+class FoundWord(db.Model):
+    """One row per word a user has found in a puzzle.
+
+    Replaces the JSON list that used to live on UserProgress.found_words;
+    recording a word is a single INSERT instead of rewriting an
+    ever-growing blob. The composite primary key doubles as the
+    (user_id, puzzle_id) lookup index and rejects duplicates.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey(
+        'user.id'), primary_key=True)
+    puzzle_id = db.Column(db.Integer, db.ForeignKey(
+        'puzzle.id'), primary_key=True)
+    word = db.Column(db.String(20), primary_key=True)
+    found_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Transaction(db.Model):
@@ -145,15 +227,31 @@ PUZZLE_TEMPLATES = [
     }
 ]
 
+# Serialize the letters of each template once at import so the puzzle
+# insert paths can store the JSON string directly; valid_words stays a
+# dict because its column is JSON-typed and serialized by the engine
+_PRECOMPUTED_TEMPLATES = [
+    {
+        **template,
+        'letters_json': _dumps(template['letters']),
+    }
+    for template in PUZZLE_TEMPLATES
+]
+
 
 def generate_daily_puzzle(date):
-    """Generate or retrieve puzzle for a specific date"""
-    # Use date as seed for consistent daily puzzles
-    random.seed(date.toordinal())
-    template = random.choice(PUZZLE_TEMPLATES)
+    """Generate or retrieve puzzle for a specific date.
+
+    letters comes back as a pre-serialized JSON string ready to assign
+    to the String column; valid_words as a dict for the JSON column.
+    """
+    # Pick deterministically by date; no RNG involved, so concurrent
+    # requests never touch shared random state
+    template = _PRECOMPUTED_TEMPLATES[
+        date.toordinal() % len(_PRECOMPUTED_TEMPLATES)]
 
     return {
-        'letters': template['letters'],
+        'letters': template['letters_json'],
         'mystery_word': template['mystery'],
         'valid_words': template['valid_words'],
         'theme': template['theme'],
@@ -161,6 +259,24 @@ def generate_daily_puzzle(date):
         'case_title': f"The {template['theme']} Mystery"
     }
 
+
+# Puzzle content is immutable once a row is created (one puzzle per day),
+# so the parsed columns can be cached in-process instead of re-parsed on
+# every request. Cleared by the seed-puzzles CLI command for safety.
+@lru_cache(maxsize=1024)
+def _valid_words_for(puzzle_id):
+    """Parsed valid_words for a puzzle as {length: frozenset}, cached per puzzle id."""
+    puzzle = db.session.get(Puzzle, puzzle_id)
+    return {length: frozenset(words)
+            for length, words in puzzle.valid_words.items()}
+
+
+@lru_cache(maxsize=1024)
+def _letters_for(puzzle_id):
+    """Parsed letters list for a puzzle, cached per puzzle id."""
+    puzzle = db.session.get(Puzzle, puzzle_id)
+    return _loads(puzzle.letters)
+
 # ============= AUTHENTICATION =============
 
 
@@ -168,23 +284,45 @@ def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 
+# Bind the signing key and algorithm list once instead of re-reading
+# app.config and rebuilding the list on every encode/decode
+_JWT_KEY = app.config['SECRET_KEY']
+_JWT_ALGORITHMS = ['HS256']
+
+
 def generate_token(user_id):
     payload = {
         'user_id': user_id,
         'exp': datetime.now(timezone.utc) + timedelta(days=30)
     }
-    return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
+    return jwt.encode(payload, _JWT_KEY, algorithm='HS256')
+
+
+# Verified-token cache so repeat requests with the same token skip the
+# HMAC verification. Keyed by a short hash of the token rather than the
+# token itself to keep the cache small; exp is re-checked on every hit,
+# so the TTL only bounds memory, not correctness.
+_token_cache = TTLCache(maxsize=50_000, ttl=60)
 
 
 def verify_token(token):
-    try:
-        payload = jwt.decode(
-            token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    cache_key = hashlib.blake2b(token.encode(), digest_size=8).digest()
+    payload = _token_cache.get(cache_key)
+    if payload is None:
+        try:
+            payload = jwt.decode(
+                token, _JWT_KEY, algorithms=_JWT_ALGORITHMS,
+                options={'require': ['exp']})
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
+        _token_cache[cache_key] = payload
         return payload['user_id']
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+
+    if payload['exp'] <= datetime.now(timezone.utc).timestamp():
         return None
+    return payload['user_id']
 
 
 def require_auth(f):
@@ -219,7 +357,10 @@ def home():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'message': 'Word Heist API is running'})
+    response = jsonify(
+        {'status': 'healthy', 'message': 'Word Heist API is running'})
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
 
 
 @app.route('/api/register', methods=['POST'])
@@ -233,10 +374,10 @@ def register():
         return jsonify({'error': 'Missing required fields'}), 400
 
     # Check if user exists
-    if User.query.filter_by(email=email).first():
+    if db.session.execute(select(User).filter_by(email=email)).scalar_one_or_none():
         return jsonify({'error': 'Email already registered'}), 400
 
-    if User.query.filter_by(username=username).first():
+    if db.session.execute(select(User).filter_by(username=username)).scalar_one_or_none():
         return jsonify({'error': 'Username already taken'}), 400
 
     # Create new user
@@ -270,9 +411,12 @@ def login():
     if not all([email, password]):
         return jsonify({'error': 'Missing email or password'}), 400
 
-    user = User.query.filter_by(email=email).first()
+    user = db.session.execute(
+        select(User).filter_by(email=email)).scalar_one_or_none()
 
-    if not user or user.password_hash != hash_password(password):
+    # compare_digest avoids the early-exit timing behaviour of !=
+    if not user or not hmac.compare_digest(user.password_hash,
+                                           hash_password(password)):
         return jsonify({'error': 'Invalid credentials'}), 401
 
     token = generate_token(user.id)
@@ -300,16 +444,17 @@ def get_daily_puzzle():
         puzzle_date = datetime.now().date()
 
     # Check if puzzle exists in database
-    puzzle = Puzzle.query.filter_by(date=puzzle_date).first()
+    puzzle = db.session.execute(
+        select(Puzzle).filter_by(date=puzzle_date)).scalar_one_or_none()
 
     if not puzzle:
         # Generate new puzzle
         puzzle_data = generate_daily_puzzle(puzzle_date)
         puzzle = Puzzle(
             date=puzzle_date,
-            letters=json.dumps(puzzle_data['letters']),
+            letters=puzzle_data['letters'],
             mystery_word=puzzle_data['mystery_word'],
-            valid_words=json.dumps(puzzle_data['valid_words']),
+            valid_words=puzzle_data['valid_words'],
             theme=puzzle_data['theme'],
             case_number=puzzle_data['case_number'],
             case_title=puzzle_data['case_title']
@@ -324,23 +469,28 @@ def get_daily_puzzle():
         token = auth_header.replace('Bearer ', '')
         user_id = verify_token(token)
         if user_id:
-            progress = UserProgress.query.filter_by(
+            progress = db.session.execute(select(UserProgress).filter_by(
                 user_id=user_id,
                 puzzle_id=puzzle.id
-            ).first()
+            )).scalar_one_or_none()
             if progress:
+                found_words = db.session.execute(
+                    select(FoundWord.word).filter_by(
+                        user_id=user_id, puzzle_id=puzzle.id)
+                    .order_by(FoundWord.found_at)
+                ).scalars().all()
                 user_progress = {
-                    'found_words': json.loads(progress.found_words),
+                    'found_words': found_words,
                     'current_score': progress.current_score,
                     'hints_used': progress.hints_used,
                     'completed': progress.completed
                 }
 
-    return jsonify({
+    response = jsonify({
         'puzzle': {
             'id': puzzle.id,
             'date': puzzle.date.isoformat(),
-            'letters': json.loads(puzzle.letters),
+            'letters': _letters_for(puzzle.id),
             'theme': puzzle.theme,
             'case_number': puzzle.case_number,
             'case_title': puzzle.case_title,
@@ -350,6 +500,28 @@ def get_daily_puzzle():
         'user_progress': user_progress
     })
 
+    # Anonymous responses are identical for everyone, so let the edge
+    # cache absorb them; the body varies with the Authorization header,
+    # so a shared cache must key on it.
+    response.vary.add('Authorization')
+    if user_progress is None:
+        if date_str:
+            # A puzzle for an explicit date never changes once generated
+            max_age = 86400
+        else:
+            # The no-date URL flips at midnight; cache only until then
+            now = datetime.now()
+            midnight = datetime.combine(
+                puzzle_date + timedelta(days=1), datetime.min.time())
+            max_age = max(60, int((midnight - now).total_seconds()))
+        response.headers['Cache-Control'] = (
+            f'public, max-age=300, s-maxage={max_age}, '
+            'stale-while-revalidate=3600')
+        response.set_etag(f'puzzle-{puzzle.id}')
+    else:
+        response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
 
 @app.route('/api/init-db')
 def init_database():
@@ -369,55 +541,75 @@ def validate_word():
     if not all([word, puzzle_id]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    # Get puzzle
-    puzzle = Puzzle.query.get(puzzle_id)
-    if not puzzle:
+    # Get puzzle and any existing progress in a single round-trip
+    # instead of separate SELECTs
+    user_id = request.user_id
+    row = db.session.execute(
+        select(Puzzle, UserProgress)
+        .select_from(Puzzle)
+        .outerjoin(UserProgress, db.and_(
+            UserProgress.user_id == user_id,
+            UserProgress.puzzle_id == Puzzle.id))
+        .where(Puzzle.id == puzzle_id)
+    ).one_or_none()
+    if row is None:
         return jsonify({'error': 'Invalid puzzle'}), 404
+    puzzle, progress = row
 
     # Check if word is valid
-    valid_words = json.loads(puzzle.valid_words)
+    valid_words = _valid_words_for(puzzle.id)
     word_length = str(len(word))
-    is_valid = word in valid_words.get(word_length, [])
+    is_valid = word in valid_words.get(word_length, ())
     is_mystery = word == puzzle.mystery_word
 
     if not is_valid:
         return jsonify({'valid': False, 'message': 'Not a valid word'}), 200
 
     # Update user progress
-    user_id = request.user_id
-    progress = UserProgress.query.filter_by(
-        user_id=user_id,
-        puzzle_id=puzzle_id
-    ).first()
-
     if not progress:
         progress = UserProgress(
             user_id=user_id,
-            puzzle_id=puzzle_id
+            puzzle_id=puzzle_id,
+            current_score=0
         )
         db.session.add(progress)
 
-    found_words = json.loads(progress.found_words)
+    found_words = db.session.execute(
+        select(FoundWord.word).filter_by(
+            user_id=user_id, puzzle_id=puzzle_id)
+        .order_by(FoundWord.found_at)
+    ).scalars().all()
 
-    if word in found_words:
+    if word in set(found_words):
         return jsonify({'valid': True, 'duplicate': True, 'message': 'Already found'}), 200
 
-    # Add word and update score
+    # Recording the word is a single INSERT; no blob rewrite
+    db.session.add(FoundWord(
+        user_id=user_id,
+        puzzle_id=puzzle_id,
+        word=word
+    ))
     found_words.append(word)
-    progress.found_words = json.dumps(found_words)
     progress.current_score += len(word) * 10
 
     if is_mystery:
         progress.current_score += 100
         progress.completed = True
 
-    # Update user's total score
-    user = User.query.get(user_id)
-    user.total_score += len(word) * 10
-    if is_mystery:
-        user.total_score += 100
-
-    db.session.commit()
+    # Update user's total score as a single atomic UPDATE instead of
+    # hydrating the User row just to read-modify-write it
+    points = len(word) * 10 + (100 if is_mystery else 0)
+    try:
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(total_score=User.total_score + points))
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent submission slipped past the duplicate check and
+        # inserted this word first; treat this one as the duplicate
+        db.session.rollback()
+        return jsonify({'valid': True, 'duplicate': True, 'message': 'Already found'}), 200
 
     return jsonify({
         'valid': True,
@@ -432,10 +624,13 @@ def validate_word():
 # ============= DATABASE INITIALIZATION =============
 
 
-# Create tables when app starts (Flask 3.0 compatible)
-with app.app_context():
-    db.create_all()
-    print("Database tables created")
+# Create tables once when the app starts (Flask 3.0 compatible). Runs a
+# single time at import, never per request; set AUTO_CREATE_TABLES=0 to
+# skip it and manage the schema through migrations instead.
+if os.environ.get('AUTO_CREATE_TABLES', '1') != '0':
+    with app.app_context():
+        db.create_all()
+        print("Database tables created")
 
 
 @app.cli.command('init-db')
@@ -449,21 +644,27 @@ def init_db():
 def seed_puzzles():
     """Generate puzzles for the next 30 days."""
     today = datetime.now().date()
-    for i in range(30):
-        puzzle_date = today + timedelta(days=i)
-        if not Puzzle.query.filter_by(date=puzzle_date).first():
-            puzzle_data = generate_daily_puzzle(puzzle_date)
-            puzzle = Puzzle(
-                date=puzzle_date,
-                letters=json.dumps(puzzle_data['letters']),
-                mystery_word=puzzle_data['mystery_word'],
-                valid_words=json.dumps(puzzle_data['valid_words']),
-                theme=puzzle_data['theme'],
-                case_number=puzzle_data['case_number'],
-                case_title=puzzle_data['case_title']
-            )
-            db.session.add(puzzle)
+    dates = [today + timedelta(days=i) for i in range(30)]
+    # One existence query for the whole window, then one batched insert
+    # flush, instead of a SELECT + INSERT round-trip per day
+    existing = set(db.session.execute(
+        select(Puzzle.date).where(Puzzle.date.in_(dates))).scalars())
+    for puzzle_date in dates:
+        if puzzle_date in existing:
+            continue
+        puzzle_data = generate_daily_puzzle(puzzle_date)
+        db.session.add(Puzzle(
+            date=puzzle_date,
+            letters=puzzle_data['letters'],
+            mystery_word=puzzle_data['mystery_word'],
+            valid_words=puzzle_data['valid_words'],
+            theme=puzzle_data['theme'],
+            case_number=puzzle_data['case_number'],
+            case_title=puzzle_data['case_title']
+        ))
     db.session.commit()
+    _valid_words_for.cache_clear()
+    _letters_for.cache_clear()
     print("Puzzles seeded for next 30 days!")
 
 